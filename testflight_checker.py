@@ -2,33 +2,52 @@
 # Import Required Libraries
 # =======================
 import json
+import math
 import time
+import random
 import sys
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, MemoryHandler
 import os
+import re
+import queue
+import threading
+from urllib.parse import urljoin, urlsplit
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+from testflight_json import json_dumps, read_json_file
 
 # =======================
 # Logging Configuration
 # =======================
 def setup_logging(log_file='testflight_checker.log'):
-    """Configure logging with file rotation"""
+    """Configure logging with file rotation, buffering records so each polling cycle is written in one batch"""
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    targets = [
+        logging.StreamHandler(),  # Console output
+        RotatingFileHandler(
+            log_file,
+            maxBytes=1_048_576,  # 1 MB
+            backupCount=5
+        )
+    ]
+    for target in targets:
+        target.setFormatter(formatter)
+    # Warnings and errors still go out immediately; logging.shutdown() flushes the rest on exit
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(levelname)s: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-        handlers=[
-            logging.StreamHandler(),  # Console output
-            RotatingFileHandler(
-                log_file,
-                maxBytes=1_048_576,  # 1 MB
-                backupCount=5
-            )
-        ]
+        handlers=[MemoryHandler(32, flushLevel=logging.WARNING, target=target) for target in targets]
     )
 
+def flush_logs():
+    """Write out any buffered log records."""
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
 # Setup logging
 setup_logging()
 
@@ -36,7 +55,24 @@ setup_logging()
 # Configuration & Constants
 # =======================
 CONFIG_FILE_PATH = "apps_config.json"  # Path to the JSON config file
-CHECK_INTERVAL = 60  # Interval to check in seconds
+CHECK_INTERVAL = 60  # Interval to check in seconds, unless an app sets its own "interval" in the config
+MIN_CHECK_INTERVAL = 30  # Lowest per-app "interval" accepted, so a bad value can't hammer Apple
+MAX_CHECK_INTERVAL = 900  # Cap for the backed-off interval of apps whose state isn't changing
+CHECK_JITTER = 0.1  # Random extra delay, as a fraction of the interval, to avoid aligned polling
+REQUEST_TIMEOUT = (3, 10)  # (connect, read) timeout in seconds
+MAX_WORKERS = 32  # Maximum number of apps checked concurrently, matches the connection pool size
+
+# Page markers used to determine the beta state, matched in a single pass over the raw bytes
+VIEW_MARKER = b"View in TestFlight"
+TESTING_MARKER = b"Testing Apps with TestFlight"
+FULL_MARKERS = (b"This beta is full", b"This beta isn't accepting any new testers")
+STATE_RE = re.compile(b"|".join(re.escape(m) for m in (VIEW_MARKER, TESTING_MARKER) + FULL_MARKERS))
+MARKER_OVERLAP = max(len(m) for m in (VIEW_MARKER, TESTING_MARKER) + FULL_MARKERS) - 1
+CHUNK_SIZE = 8192  # Bytes read per chunk when streaming TestFlight pages
+# Markers sit near the top of the page, so ask for the first 8 KB only; identity encoding
+# keeps the byte range meaningful and decodable on its own
+RANGE_HEADERS = {"Range": "bytes=0-8191", "Accept-Encoding": "identity"}
+REDIRECT_FULL_HINTS = ("error", "full")  # Redirect path segments that mean the beta can't be joined
 
 # =======================
 # Load Environment Variables
@@ -46,28 +82,53 @@ load_dotenv()  # Ensure .env file is loaded
 # Retrieve the Webhook URL from the environment variable
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
+# Pending Discord notifications, drained by a single background worker
+NOTIFY_QUEUE = queue.Queue()
+NOTIFY_MAX_ATTEMPTS = 3  # Attempts per notification when Discord rate limits us
+NOTIFY_BATCH_SIZE = 10  # Discord accepts at most 10 embeds per webhook message
+NOTIFY_BATCH_WINDOW = 2  # Seconds to wait for more events before posting a batch
+NOTIFY_SHUTDOWN_TIMEOUT = 30  # Seconds to wait at exit for pending notifications to be posted
+
+# =======================
+# HTTP Session
+# =======================
+def create_session():
+    """Create a shared session so TestFlight and Discord connections are kept alive between checks"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=MAX_WORKERS,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"]  # Only page polls are retried in-band; webhook posts handle 429 themselves
+        )
+    )
+    session.mount("https://", adapter)
+    # Accept-Encoding is left to requests, which advertises br when brotli is installed
+    session.headers.update({'User-Agent': 'Mozilla/5.0'})
+    return session
+
+SESSION = create_session()
+atexit.register(SESSION.close)  # Release pooled connections on exit
+
 # =======================
 # Helper Functions
 # =======================
-def make_safe_request(url, method='get', timeout=10, **kwargs):
+def make_safe_request(url, method='get', timeout=REQUEST_TIMEOUT, **kwargs):
     """
     Safely make HTTP requests with error handling and timeout
 
     :param url: URL to request
     :param method: HTTP method (get, post)
-    :param timeout: Request timeout in seconds
+    :param timeout: Request timeout in seconds, or a (connect, read) tuple
     :param kwargs: Additional requests arguments
     :return: Response or None
     """
     try:
-        # Add headers to prevent potential blocking
-        headers = kwargs.pop('headers', {})
-        headers.setdefault('User-Agent', 'Mozilla/5.0')
-
-        # Choose the appropriate request method
-        request_method = getattr(requests, method.lower())
-
-        response = request_method(url, timeout=timeout, headers=headers, **kwargs)
+        # Reuse pooled connections and default headers from the shared session
+        response = SESSION.request(method.upper(), url, timeout=timeout, **kwargs)
         response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
@@ -83,70 +144,246 @@ def load_config(file_path, default_content=None):
     :return: Configuration dictionary
     """
     try:
-        if not os.path.exists(file_path):
-            if default_content is not None:
-                with open(file_path, 'w') as f:
-                    json.dump(default_content, f, indent=4)
-            return default_content or {}
-
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        with open(file_path, 'rb') as f:  # Open directly; the file is almost always there
+            return read_json_file(f)
+    except FileNotFoundError:
+        if default_content is not None:
+            try:
+                with open(file_path, 'wb') as f:
+                    f.write(json_dumps(default_content))
+            except OSError as e:
+                logging.error(f"Error creating configuration: {e}")
+        return default_content or {}
+    except json.JSONDecodeError as e:
         logging.error(f"Error loading configuration: {e}")
         return default_content or {}
 
+def normalize_apps(apps):
+    """
+    Convert apps configured with only a URL into the full app entry format
+
+    :param apps: Apps configuration, updated in place
+    :return: True if any entry was converted
+    """
+    converted = False
+    for app_name, app_data in apps.items():
+        if isinstance(app_data, str):
+            apps[app_name] = {"url": app_data, "last_state": None}
+            converted = True
+    return converted
+
+def base_interval(app_name, app_data):
+    """
+    Read an app's base polling interval from its optional "interval" config key
+
+    :param app_name: Name of the app, used in warnings
+    :param app_data: App configuration entry
+    :return: Interval in seconds, CHECK_INTERVAL when unset or invalid
+    """
+    value = app_data.get("interval", CHECK_INTERVAL)
+    try:
+        interval = float(value)
+    except (TypeError, ValueError):
+        interval = math.nan
+    if not (math.isfinite(interval) and interval >= MIN_CHECK_INTERVAL):
+        logging.warning(f"Invalid interval {value!r} for {app_name} (minimum {MIN_CHECK_INTERVAL}s), using {CHECK_INTERVAL}s.")
+        return CHECK_INTERVAL
+    return interval
+
 def save_apps(apps):
-    """Save the apps configuration to the JSON file."""
+    """Save the apps configuration to the JSON file atomically via a temporary file."""
     try:
-        with open(CONFIG_FILE_PATH, "w") as file:
-            json.dump(apps, file, indent=4)
+        tmp_path = CONFIG_FILE_PATH + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(json_dumps(apps))
+            file.flush()
+            os.fsync(file.fileno())  # Make sure the data is on disk before the rename
+        os.replace(tmp_path, CONFIG_FILE_PATH)
         logging.info("Configuration saved.")
     except Exception as e:
         logging.error(f"Error saving config file: {e}")
 
-def send_discord_notification(app_name, testflight_url, message):
-    """Send a notification to Discord via a webhook."""
-    if DISCORD_WEBHOOK_URL:  # Only send notification if the webhook URL is set
-        try:
-            response = make_safe_request(
+def post_discord_notification(batch):
+    """
+    Post a batch of notifications to the Discord webhook as one message, waiting out 429 rate limits.
+
+    :param batch: List of (app_name, testflight_url, message) tuples, at most NOTIFY_BATCH_SIZE long
+    """
+    app_names = ", ".join(app_name for app_name, _, _ in batch)
+    embeds = [
+        {"title": app_name, "description": message, "url": testflight_url}
+        for app_name, testflight_url, message in batch
+    ]
+    try:
+        for _ in range(NOTIFY_MAX_ATTEMPTS):
+            response = SESSION.post(
                 DISCORD_WEBHOOK_URL,
-                method='post',
-                json={"content": message}
+                json={"embeds": embeds},
+                timeout=REQUEST_TIMEOUT
             )
+            if response.status_code != 429:
+                break
+            retry_after = float(response.headers.get("Retry-After", 1))
+            logging.warning(f"Discord rate limited notification for {app_names}, retrying in {retry_after}s.")
+            time.sleep(retry_after)
 
-            if response:
-                logging.info(f"Notification sent: {message}")
-            else:
-                logging.warning(f"Failed to send notification for {app_name}")
-        except Exception as e:
-            logging.error(f"Error sending notification for {app_name}: {e}")
+        response.raise_for_status()
+        for _, _, message in batch:
+            logging.info(f"Notification sent: {message}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"Error sending notification for {app_names}: {e}")
+
+def notification_worker():
+    """Coalesce queued notifications into batched posts so Discord latency never blocks the checks."""
+    stopping = False
+    while not stopping:
+        item = NOTIFY_QUEUE.get()
+        if item is None:  # Shutdown sentinel from stop_notifications()
+            return
+        batch = [item]
+        deadline = time.monotonic() + NOTIFY_BATCH_WINDOW
+        while len(batch) < NOTIFY_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = NOTIFY_QUEUE.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:  # Post what is held now instead of waiting out the window
+                stopping = True
+                break
+            batch.append(item)
+        post_discord_notification(batch)
+        flush_logs()
+
+def stop_notifications(worker):
+    """
+    Stop the notification worker at exit once everything queued, including a batch it is holding, is posted
+
+    :param worker: The notification worker thread
+    """
+    NOTIFY_QUEUE.put(None)
+    worker.join(timeout=NOTIFY_SHUTDOWN_TIMEOUT)
+
+def send_discord_notification(app_name, testflight_url, message):
+    """Queue a notification to Discord via a webhook."""
+    if DISCORD_WEBHOOK_URL:  # Only send notification if the webhook URL is set
+        NOTIFY_QUEUE.put((app_name, testflight_url, message))
     else:
         logging.warning(f"Skipping notification for {app_name} as DISCORD_WEBHOOK_URL is not set.")
 
+def state_from_markers(first_seen):
+    """Derive the beta state from the first offset of each marker found on the page"""
+    if VIEW_MARKER in first_seen and TESTING_MARKER in first_seen:
+        return "available" if first_seen[VIEW_MARKER] < first_seen[TESTING_MARKER] else "full"
+    if any(marker in first_seen for marker in FULL_MARKERS):
+        return "full"
+    return "unknown"
+
+def is_state_decided(first_seen):
+    """Return True once markers still to come can no longer change the state"""
+    if TESTING_MARKER not in first_seen:
+        return False
+    return VIEW_MARKER in first_seen or any(marker in first_seen for marker in FULL_MARKERS)
+
+def scan_markers(chunks):
+    """
+    Find the first offset of each state marker in a streamed TestFlight page, stopping early once decided
+
+    :param chunks: Iterable of raw page bytes
+    :return: Dictionary mapping each marker found to its first offset
+    """
+    first_seen = {}
+    buffer = b""
+    offset = 0  # Absolute page offset of buffer[0]
+    for chunk in chunks:
+        buffer += chunk
+        for match in STATE_RE.finditer(buffer):
+            first_seen.setdefault(match.group(), offset + match.start())
+
+        if is_state_decided(first_seen):
+            break
+
+        # Keep enough of the tail to catch markers split across chunks
+        tail = buffer[-MARKER_OVERLAP:]
+        offset += len(buffer) - len(tail)
+        buffer = tail
+
+    return first_seen
+
+def fetch_state(testflight_url, headers, partial=True):
+    """
+    Fetch a TestFlight page and determine its state, downloading as little of it as possible
+
+    :param testflight_url: TestFlight URL to check
+    :param headers: Request headers (e.g. conditional request validators)
+    :param partial: Request only the start of the page, retrying in full if that is not decisive
+    :return: (response, state) with state None for a 304, or (None, None) on failure
+    """
+    request_headers = dict(headers, **RANGE_HEADERS) if partial else dict(headers)
+    response = make_safe_request(testflight_url, headers=request_headers, stream=True, allow_redirects=False)
+
+    # Decide from the redirect target alone when it points at an error/full page, otherwise follow it
+    if response is not None and response.is_redirect:
+        with response:
+            location = urljoin(response.url, response.headers["Location"])
+        # Only whole path segments count, so a join code that happens to contain a hint isn't mistaken for one
+        if any(segment in REDIRECT_FULL_HINTS for segment in urlsplit(location).path.lower().split("/")):
+            return response, "full"
+        response = make_safe_request(location, headers=request_headers, stream=True)
+
+    if not response:
+        return None, None
+
+    with response:
+        if response.status_code == 304:
+            return response, None
+        first_seen = scan_markers(response.iter_content(chunk_size=CHUNK_SIZE))
+
+    if response.status_code == 206 and not is_state_decided(first_seen):
+        # The full page comes in a different encoding, whose validators would not match the ranged probe's,
+        # so fetch it unconditionally and keep the probe's validators for the next check
+        full_response, state = fetch_state(testflight_url, {}, partial=False)
+        return (response, state) if full_response else (None, None)
+
+    return response, state_from_markers(first_seen)
+
 def check_testflight_slot(app_name, app_data):
-    """Check if a TestFlight slot is available or full for a specific app and notify accordingly."""
+    """
+    Check if a TestFlight slot is available or full for a specific app and notify accordingly.
+
+    :return: True if app_data was modified and needs saving
+    """
+    changed = False
     try:
         testflight_url = app_data["url"]
         last_state = app_data.get("last_state", None)  # Default to None if not present
 
-        response = make_safe_request(testflight_url)
+        # Send cached validators so an unchanged page comes back as a bodyless 304
+        headers = {}
+        if app_data.get("etag"):
+            headers["If-None-Match"] = app_data["etag"]
+        if app_data.get("last_modified"):
+            headers["If-Modified-Since"] = app_data["last_modified"]
+
+        # Determine the current state for the app, reading only as much of the page as needed
+        response, current_state = fetch_state(testflight_url, headers)
 
         if not response:
             logging.error(f"Failed to fetch TestFlight status for {app_name}")
-            return
+            return changed
 
-        # Determine the current state for the app
-        if "View in TestFlight" in response.text and "Testing Apps with TestFlight" in response.text:
-            view_index = response.text.find("View in TestFlight")
-            testing_index = response.text.find("Testing Apps with TestFlight")
-            if view_index < testing_index:
-                current_state = "available"
-            else:
-                current_state = "full"
-        elif "This beta is full" in response.text or "This beta isn't accepting any new testers" in response.text:
-            current_state = "full"
-        else:
-            current_state = "unknown"
+        if response.status_code == 304:
+            logging.info(f"No state change for {app_name} (current state: {last_state}, not modified).")
+            return changed
+
+        # Remember validators for the next conditional request, unless the state came from a redirect alone
+        for header, key in (("ETag", "etag"), ("Last-Modified", "last_modified")):
+            value = None if response.is_redirect else response.headers.get(header)
+            if value and app_data.get(key) != value:
+                app_data[key] = value
+                changed = True
 
         # Handle state changes for the app
         if current_state != last_state:
@@ -160,12 +397,15 @@ def check_testflight_slot(app_name, app_data):
                 logging.info(f"State changed for {app_name}, current state: {current_state}.")
 
             app_data["last_state"] = current_state
+            changed = True
         else:
             logging.info(f"No state change for {app_name} (current state: {current_state}).")
 
     except Exception as e:
         logging.error(f"Error checking slots for {app_name}: {e}")
 
+    return changed
+
 # =======================
 # Main Execution
 # =======================
@@ -176,20 +416,52 @@ def main():
         logging.warning("No apps to monitor.")
         sys.exit(0)
 
+    # Initialize state for new apps if only URL is present
+    if normalize_apps(apps):
+        save_apps(apps)
+
     logging.info("Starting TestFlight slot checker.")
+    notifier = threading.Thread(target=notification_worker, name="discord-notifier", daemon=True)
+    notifier.start()
+    atexit.register(stop_notifications, notifier)
+
+    # One worker pool for the lifetime of the checker, shared by every cycle
+    executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(apps)), thread_name_prefix="checker")
+
+    # Per-app polling schedule, kept in memory only: {app_name: {"next_check_ts", "interval", "backoff"}}
+    # Apps may set their own base "interval" in the config, otherwise CHECK_INTERVAL is used
+    schedule = {}
+    for app_name, app_data in apps.items():
+        interval = base_interval(app_name, app_data)
+        schedule[app_name] = {"next_check_ts": 0.0, "interval": interval, "backoff": interval}
 
     while True:
-        for app_name, app_data in apps.items():
-            # Initialize state for new apps if only URL is present
-            if isinstance(app_data, str):
-                apps[app_name] = {"url": app_data, "last_state": None}
-                app_data = apps[app_name]
+        now = time.monotonic()
+        due = [app_name for app_name in apps if schedule[app_name]["next_check_ts"] <= now]
+        previous_states = {app_name: apps[app_name].get("last_state") for app_name in due}
 
+        # Check all due apps concurrently so a cycle takes max(RTT) instead of sum(RTT)
+        futures = []
+        for app_name in due:
             logging.info(f"Checking: {app_name}")
-            check_testflight_slot(app_name, app_data)
+            futures.append(executor.submit(check_testflight_slot, app_name, apps[app_name]))
+
+        if any([future.result() for future in futures]):
+            save_apps(apps)  # Only touch the disk when something changed
+
+        # Back off apps whose state is stable, reset the ones that just changed
+        now = time.monotonic()
+        for app_name in due:
+            entry = schedule[app_name]
+            if apps[app_name].get("last_state") == previous_states[app_name]:
+                entry["backoff"] = min(entry["backoff"] * 2, max(MAX_CHECK_INTERVAL, entry["interval"]))
+            else:
+                entry["backoff"] = entry["interval"]
+            entry["next_check_ts"] = now + entry["backoff"] + random.uniform(0, entry["backoff"] * CHECK_JITTER)
 
-        save_apps(apps)  # Save updates after each cycle
-        time.sleep(1)
+        next_check_ts = min(entry["next_check_ts"] for entry in schedule.values())
+        flush_logs()
+        time.sleep(max(0, next_check_ts - time.monotonic()))
 
 if __name__ == "__main__":
     main()
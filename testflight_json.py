@@ -0,0 +1,42 @@
+# =======================
+# Shared JSON Helpers
+# =======================
+# Used by both testflight_checker.py and testflight_manager.py so apps_config.json is
+# formatted the same way whichever script saves it, with or without orjson.
+import json
+import mmap
+import os
+
+try:
+    import orjson  # Optional C-accelerated JSON backend
+except ImportError:
+    orjson = None
+
+JSON_INDENT = 2  # orjson only supports 2-space indentation, so stdlib json uses it too
+MMAP_THRESHOLD = 64 * 1024  # Files larger than this are parsed straight from a memory map
+
+def json_dumps(obj):
+    """Serialize to indented UTF-8 JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    # orjson writes non-ASCII characters (e.g. in app names) as raw UTF-8, not \u escapes
+    return json.dumps(obj, indent=JSON_INDENT, ensure_ascii=False).encode("utf-8")
+
+def json_loads(data):
+    """Parse JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json_file(file):
+    """
+    Parse an open binary JSON file, mapping it into memory when it is large and orjson can take the buffer
+
+    :param file: File object opened in binary mode
+    :return: Parsed JSON content
+    """
+    # fstat the open file itself: a size stat'ed by path before open may belong to a file since replaced
+    if orjson is not None and os.fstat(file.fileno()).st_size > MMAP_THRESHOLD:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+    return json_loads(file.read())
@@ -18,9 +18,9 @@ MULTIPLE_INSTANCES = False  # Set to True for multiple simultaneous instances, F
 ################################################################################
 # Imports 
 ################################################################################
-import json,os,subprocess,shutil,requests,re,logging,unicodedata
-from packaging import version
+import json,os,subprocess,shutil,re,logging,unicodedata,functools,time,shlex,sys
 from typing import Dict
+from testflight_json import json_dumps,read_json_file
 
 ################################################################################
 # Logging Setup
@@ -34,14 +34,49 @@ logger = logging.getLogger(__name__)
 CURRENT_VERSION = "v0.1.3-beta"
 CONFIG_FILE_PATH = "apps_config.json"
 PM2_PROCESS_NAME = "testflight_checker"
+ECOSYSTEM_FILE_PATH = "ecosystem.config.json"
 WEBHOOK_URL_PATTERN = r"^https://discord\.com/api/webhooks/\d+/[A-Za-z0-9_-]+$"
+WEBHOOK_URL_RE = re.compile(WEBHOOK_URL_PATTERN)
+GITHUB_RELEASES_URL = "https://api.github.com/repos/AT3K/TestFlight-Checker/releases"
+CACHE_DIR = ".cache"
+RELEASES_CACHE_TTL = 300  # Seconds a cached releases list is used without asking GitHub
+# Control characters (C0, DEL, C1) and dangerous filesystem characters are dropped, spaces become underscores
+SANITIZE_TABLE = dict.fromkeys([*range(0x20), *range(0x7F, 0xA0), *map(ord, '<>:"/\\|?*')])
+SANITIZE_TABLE[ord(' ')] = '_'
+RELEASE_TAG_RE = re.compile(r"^v?(\d+)\.(\d+)\.(\d+)(?:-(alpha|beta)(\d*))?$")
+ENV_LINE_RE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)=(.*)$",re.M)
+ENV_WEBHOOK_LINE_RE = re.compile(r"^DISCORD_WEBHOOK_URL=.*$",re.M)
+
+################################################################################
+# Module State
+################################################################################
+_APPS_CACHE:tuple=(None,None)  # ((config st_mtime_ns, st_size), parsed apps)
+_CONFIG_ENSURED=False  # True once this session has seen the config file on disk
+
+################################################################################
+# HTTP Session
+################################################################################
+@functools.lru_cache(maxsize=1)
+def http_session():
+    # Created on first use so menu actions that never touch the network don't import requests
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session=requests.Session()  # Keeps TLS connections to GitHub and Discord alive between calls
+    session.headers.update({"User-Agent":f"TestFlight-Checker/{CURRENT_VERSION}"})
+    # Retries reuse the pooled connection; POSTs are only retried on connect errors, so Discord never gets duplicates
+    session.mount("https://",HTTPAdapter(pool_connections=4,pool_maxsize=4,max_retries=Retry(total=2,backoff_factor=0.2)))
+    return session
 
 ################################################################################
 # Utility Functions
 ################################################################################
-def safe_subprocess_run(command:list,check:bool=True,capture_output:bool=False)->subprocess.CompletedProcess:
+def safe_subprocess_run(command:list,check:bool=True,capture_output:bool=False,quiet:bool=False)->subprocess.CompletedProcess:
     try:
         sanitized_command = [str(arg) for arg in command]
+        if quiet:
+            # Output is discarded: no pipes, no decoding, and no fd-closing loop (fds are non-inheritable since PEP 446)
+            return subprocess.run(sanitized_command,check=check,stdout=subprocess.DEVNULL,shell=False,close_fds=False)
         return subprocess.run(sanitized_command,check=check,capture_output=capture_output,text=True,shell=False,encoding='utf-8',errors='strict')
     except subprocess.CalledProcessError as e:
         logger.error(f"Command execution failed: {e}")
@@ -51,6 +86,11 @@ def safe_subprocess_run(command:list,check:bool=True,capture_output:bool=False)-
         logger.error(f"Unexpected error running command: {e}")
         raise
 
+def run_pm2_batch(*commands:list)->subprocess.CompletedProcess:
+    # Run several pm2 commands (argv lists) in one shell so a user action pays for one spawn instead of one per command
+    return safe_subprocess_run(["sh","-c"," && ".join(shlex.join(command) for command in commands)],quiet=True)
+
+@functools.lru_cache(maxsize=None)  # PATH doesn't change during a session
 def is_tool_installed(tool_name:str)->bool:
     return shutil.which(tool_name) is not None
 
@@ -58,28 +98,36 @@ def is_tool_installed(tool_name:str)->bool:
 # Webhook Management
 ################################################################################
 def create_env_file()->None:
-    if not os.path.exists(".env"):
-        with open(".env","w") as f:f.write("DISCORD_WEBHOOK_URL=''\n")
+    try:
+        with open(".env","x") as f:f.write("DISCORD_WEBHOOK_URL=''\n")  # "x" only creates a missing file
         logger.info(".env file created with empty DISCORD_WEBHOOK_URL.")
+    except FileExistsError:pass
 
-def check_webhook()->bool:
+@functools.lru_cache(maxsize=1)
+def _parse_env(stat_key:tuple)->Dict[str,str]:
+    # Keyed on .env (mtime, size, inode) so the file is only re-read after it changes, even within one mtime tick
+    with open(".env","r") as f:content=f.read()
+    return {key:value.strip().strip("'\"") for key,value in ENV_LINE_RE.findall(content)}
+
+def read_env()->Dict[str,str]:
     create_env_file()
-    with open(".env","r") as f:
-        for line in f:
-            if line.startswith("DISCORD_WEBHOOK_URL="):
-                return bool(line.strip().split("=")[1].strip("'"))
-    return False
+    st=os.stat(".env")
+    return _parse_env((st.st_mtime_ns,st.st_size,st.st_ino))
+
+def check_webhook()->bool:
+    return bool(read_env().get("DISCORD_WEBHOOK_URL"))
 
 def validate_discord_webhook_format(webhook_url:str)->bool:
-    if re.match(WEBHOOK_URL_PATTERN,webhook_url):return True
+    if WEBHOOK_URL_RE.match(webhook_url):return True
     logger.warning("Invalid Discord webhook URL format.")
     logger.warning("Format: https://discord.com/api/webhooks/<webhook_id>/<webhook_token>")
     return False
 
 def validate_discord_webhook(webhook_url:str,timeout:int=10)->bool:
     if not validate_discord_webhook_format(webhook_url):return False
+    import requests
     try:
-        response=requests.post(webhook_url,json={"content":"Test message from TestFlight Manager"},timeout=timeout)
+        response=http_session().post(webhook_url,json={"content":"Test message from TestFlight Manager"},timeout=timeout)
         response.raise_for_status()
         logger.info("Discord webhook URL is valid.")
         return True
@@ -90,22 +138,41 @@ def validate_discord_webhook(webhook_url:str,timeout:int=10)->bool:
 ################################################################################
 # App Management
 ################################################################################
+def _stat_key(path:str)->tuple:
+    # Size as well as mtime, so a rewrite within the filesystem's timestamp granularity is still noticed
+    st=os.stat(path)
+    return (st.st_mtime_ns,st.st_size)
+
 def load_apps()->Dict[str,str]:
-    if not os.path.exists(CONFIG_FILE_PATH):
+    global _APPS_CACHE,_CONFIG_ENSURED
+    try:
+        key=_stat_key(CONFIG_FILE_PATH)
+        _CONFIG_ENSURED=True
+        if _APPS_CACHE[0]==key:return dict(_APPS_CACHE[1])  # Unchanged since last parse
+        with open(CONFIG_FILE_PATH,"rb") as f:apps=read_json_file(f)
+    except FileNotFoundError:
         logger.info("Config file not found. Creating new blank file.")
         save_apps({})
         return {}
-    try:
-        with open(CONFIG_FILE_PATH,"r") as f:return json.load(f)
     except json.JSONDecodeError:
         logger.warning("Config file corrupted. Creating new blank file.")
         save_apps({})
         return {}
+    _APPS_CACHE=(key,apps)
+    return dict(apps)
 
 def save_apps(apps:Dict[str,str])->None:
-    with open(CONFIG_FILE_PATH,"w") as f:
-        json.dump(apps,f,indent=4)
-        logger.info("Configuration saved.")
+    global _APPS_CACHE,_CONFIG_ENSURED
+    _APPS_CACHE=(None,None)
+    data=json_dumps(apps)  # Serialize up front so the file gets a single write
+    with open(CONFIG_FILE_PATH+".tmp","wb",buffering=64*1024) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())  # Data must be durable before the rename replaces the old config
+    os.replace(CONFIG_FILE_PATH+".tmp",CONFIG_FILE_PATH)
+    _CONFIG_ENSURED=True
+    logger.info("Configuration saved.")
+    _APPS_CACHE=(_stat_key(CONFIG_FILE_PATH),dict(apps))  # Next load_apps() needs no re-read
 
 def list_apps()->None:
     apps=load_apps()
@@ -124,14 +191,12 @@ def sanitize_app_name(app_name: str) -> str:
     Returns:
         str: Sanitized app name
     """
-    # Remove control characters but keep unicode letters/numbers from any language
-    sanitized = ''.join(char for char in app_name if not unicodedata.category(char).startswith('C'))
+    # Remove control and dangerous filesystem characters and replace spaces in one C-level pass
+    sanitized = app_name.translate(SANITIZE_TABLE)
     
-    # Remove dangerous filesystem characters but keep unicode
-    sanitized = re.sub(r'[<>:"/\\|?*]', '', sanitized)
-    
-    # Replace spaces with underscores
-    sanitized = sanitized.replace(' ', '_')
+    # Remove remaining unicode control/format characters but keep letters/numbers from any language
+    if not sanitized.isascii():
+        sanitized = ''.join(char for char in sanitized if not unicodedata.category(char).startswith('C'))
     
     # Limit length to 50 characters (unicode-aware)
     sanitized = sanitized[:50]
@@ -166,7 +231,12 @@ def add_app() -> None:
         return
         
     apps = load_apps()
-    apps[app_name] = testflight_url
+    previous = apps.get(app_name)
+    # Keep a custom polling interval when re-adding an existing app; its state is reset for the new URL
+    if isinstance(previous, dict) and "interval" in previous:
+        apps[app_name] = {"url": testflight_url, "interval": previous["interval"]}
+    else:
+        apps[app_name] = testflight_url
     save_apps(apps)
     restart_checker()
 
@@ -175,13 +245,14 @@ def remove_app()->None:
     if not apps:
         logger.warning("No apps to remove.")
         return
+    names=list(apps)  # Realized once so the listed order is the order chosen from
     print("Select app to remove:")
-    for idx,(name,_) in enumerate(apps.items(),1):print(f"{chr(64+idx)}. {name}")
-    choice=input("Enter option (A,B,C...): ").strip().upper()
-    if not choice.isalpha() or ord(choice)<65 or ord(choice)>64+len(apps):
+    for idx,name in enumerate(names,1):print(f"{idx}. {name}")
+    choice=input(f"Enter option (1-{len(names)}): ").strip()
+    if not choice.isdigit() or not 1<=int(choice)<=len(names):
         logger.warning("Invalid option.")
         return
-    app_name=list(apps.keys())[ord(choice)-65]
+    app_name=names[int(choice)-1]
     del apps[app_name]
     save_apps(apps)
     logger.info(f"App '{app_name}' removed.")
@@ -190,22 +261,41 @@ def remove_app()->None:
 ################################################################################
 # Process Management (PM2)
 ################################################################################
+def _post_launch_checks()->None:
+    global _CONFIG_ENSURED
+    # Shared by start and restart: .env is read through the mtime cache, the config is only stat'ed until seen once
+    if not check_webhook():logger.warning("Webhook URL empty. Notifications not set.")
+    if _CONFIG_ENSURED:return
+    try:os.stat(CONFIG_FILE_PATH)
+    except FileNotFoundError:
+        save_apps({})
+        logger.info("Created new configuration file.")
+    else:_CONFIG_ENSURED=True
+
+def create_ecosystem_file()->None:
+    # Lets a single `pm2 startOrReload` start or refresh the checker without a separate delete
+    data=json_dumps({"apps":[{"name":PM2_PROCESS_NAME,"script":"testflight_checker.py","interpreter":sys.executable}]})
+    try:
+        with open(ECOSYSTEM_FILE_PATH,"rb") as f:
+            if f.read()==data:return  # Already up to date
+    except FileNotFoundError:pass
+    # Rewritten when the name or interpreter changed, via a temp file so pm2 never reads a partial one
+    with open(ECOSYSTEM_FILE_PATH+".tmp","wb") as f:f.write(data)
+    os.replace(ECOSYSTEM_FILE_PATH+".tmp",ECOSYSTEM_FILE_PATH)
+
 def start_checker()->None:
     create_env_file()
     if not is_tool_installed("pm2"):
         logger.error("PM2 not installed. Install with:\n1. sudo apt update\n2. sudo apt install nodejs npm -y\n3. sudo npm install -g pm2")
         return
-    if not MULTIPLE_INSTANCES:
-        try:safe_subprocess_run(["pm2","delete",PM2_PROCESS_NAME],check=False)
-        except subprocess.CalledProcessError:pass
+    if MULTIPLE_INSTANCES:start=["pm2","start","testflight_checker.py","--name",PM2_PROCESS_NAME,"--update-env","-f"]
+    else:
+        create_ecosystem_file()
+        start=["pm2","startOrReload",ECOSYSTEM_FILE_PATH,"--update-env"]  # Starts or reloads the one instance in place
     try:
-        safe_subprocess_run(["pm2","start","testflight_checker.py","--name",PM2_PROCESS_NAME,"--update-env","-f"])
-        safe_subprocess_run(["pm2","save"])
+        run_pm2_batch(start,["pm2","save"])
         logger.info("Slot checker started with updated environment variables.")
-        if not check_webhook():logger.warning("Webhook URL empty. Notifications not set.")
-        if not os.path.exists(CONFIG_FILE_PATH):
-            save_apps({})
-            logger.info("Created new configuration file.")
+        _post_launch_checks()
     except subprocess.CalledProcessError as e:logger.error(f"Failed to start checker: {e}")
 
 def stop_checker()->None:
@@ -213,7 +303,7 @@ def stop_checker()->None:
         logger.error("PM2 not installed.")
         return
     try:
-        safe_subprocess_run(["pm2","stop",PM2_PROCESS_NAME])
+        safe_subprocess_run(["pm2","stop",PM2_PROCESS_NAME],quiet=True)
         logger.info("Slot checker stopped.")
     except subprocess.CalledProcessError as e:logger.error(f"Failed to stop checker: {e}")
 
@@ -223,13 +313,9 @@ def restart_checker()->None:
         logger.error("PM2 not installed.")
         return
     try:
-        safe_subprocess_run(["pm2","restart",PM2_PROCESS_NAME])
-        safe_subprocess_run(["pm2","save"])
+        run_pm2_batch(["pm2","restart",PM2_PROCESS_NAME],["pm2","save"])
         logger.info("Slot checker restarted with updated environment variables.")
-        if not check_webhook():logger.warning("Webhook URL empty. Notifications not set.")
-        if not os.path.exists(CONFIG_FILE_PATH):
-            save_apps({})
-            logger.info("Created new configuration file.")
+        _post_launch_checks()
     except subprocess.CalledProcessError as e:logger.error(f"Failed to restart checker: {e}")
 
 ################################################################################
@@ -250,34 +336,123 @@ def update_webhook()->None:
         logger.warning("Webhook URL not updated.")
         return
     if not validate_discord_webhook(webhook_url):return
-    with open(".env","r") as f:lines=f.readlines()
-    with open(".env","w") as f:
-        for line in lines:
-            f.write(f"DISCORD_WEBHOOK_URL='{webhook_url}'\n" if line.startswith("DISCORD_WEBHOOK_URL=") else line)
+    create_env_file()
+    with open(".env","r") as f:content=f.read()
+    new_line="DISCORD_WEBHOOK_URL='{}'".format(webhook_url.replace("'","\\'"))
+    content,count=ENV_WEBHOOK_LINE_RE.subn(lambda _:new_line,content)  # Every occurrence, so no stale duplicate survives
+    if count==0:content+=("" if not content or content.endswith("\n") else "\n")+new_line+"\n"
+    # Created owner-only, then given .env's own mode, so the webhook URL and token are never more readable than before
+    with os.fdopen(os.open(".env.tmp",os.O_WRONLY|os.O_CREAT|os.O_TRUNC,0o600),"w") as f:f.write(content)
+    shutil.copymode(".env",".env.tmp")
+    os.replace(".env.tmp",".env")  # Never leave a half-written .env behind
     logger.info("Webhook URL updated.")
     restart_checker()
 
+def fetch_releases_cached(url:str,cache_name:str,ttl:int=RELEASES_CACHE_TTL):
+    """
+    Fetch a GitHub releases API response through an on-disk cache named cache_name.
+
+    A cache younger than ttl seconds is returned without any request; an older one is
+    revalidated with If-None-Match, so an unchanged response costs a bodyless 304 that doesn't
+    count against the API rate limit. GITHUB_TOKEN from .env is sent when set.
+    """
+    cache_path=os.path.join(CACHE_DIR,f"{cache_name}.json")
+    etag_path=os.path.join(CACHE_DIR,f"{cache_name}.etag")
+    try:
+        if time.time()-os.path.getmtime(cache_path)<ttl:
+            with open(cache_path,"r") as f:return json.load(f)
+    except (OSError,json.JSONDecodeError):pass
+    headers={"Accept":"application/vnd.github+json"}
+    if os.path.exists(cache_path) and os.path.exists(etag_path):
+        with open(etag_path,"r") as f:headers["If-None-Match"]=f.read().strip()
+    token=read_env().get("GITHUB_TOKEN")
+    if token:headers["Authorization"]=f"Bearer {token}"
+    response=http_session().get(url,headers=headers,timeout=10)
+    if response.status_code==304:
+        try:
+            with open(cache_path,"r") as f:releases=json.load(f)
+            os.utime(cache_path,None)  # Revalidated, restart the TTL
+            return releases
+        except (OSError,json.JSONDecodeError):
+            # The ETag outlived a missing or damaged cache: drop it and fetch the full list
+            try:os.remove(etag_path)
+            except FileNotFoundError:pass
+            del headers["If-None-Match"]
+            response=http_session().get(url,headers=headers,timeout=10)
+    response.raise_for_status()
+    releases=response.json()
+    os.makedirs(CACHE_DIR,exist_ok=True)
+    # Cache first, then its ETag, each via a temp file, so an ETag never points at a partial cache
+    with open(cache_path+".tmp","w") as f:json.dump(releases,f)
+    os.replace(cache_path+".tmp",cache_path)
+    if response.headers.get("ETag"):
+        with open(etag_path+".tmp","w") as f:f.write(response.headers["ETag"])
+        os.replace(etag_path+".tmp",etag_path)
+    else:
+        try:os.remove(etag_path)
+        except FileNotFoundError:pass
+    return releases
+
+def release_tag_key(tag:str):
+    # Tuple that orders vX.Y.Z[-alpha|-beta[N]] tags like PEP 440 does (alpha < beta < final), None for other formats
+    match=RELEASE_TAG_RE.match(tag)
+    if not match:return None
+    major,minor,patch,pre,number=match.groups()
+    return (int(major),int(minor),int(patch),{"alpha":0,"beta":1,None:2}[pre],int(number or 0))
+
+def release_key_str(key:tuple)->str:
+    # Normalized PEP 440 form of a release_tag_key tuple, matching what packaging prints (e.g. 0.1.3b0)
+    major,minor,patch,pre,number=key
+    return f"{major}.{minor}.{patch}"+("" if pre==2 else f"{'ab'[pre]}{number}")
+
+def parse_release_tag(tag:str):
+    from packaging import version
+    return version.parse(tag.lstrip("v"))
+
+def fetch_channel_releases(release_type:str)->list:
+    import requests
+    if release_type=="stable":
+        # /latest is GitHub's newest release not flagged as prerelease, normally the newest stable tag
+        try:latest=fetch_releases_cached(f"{GITHUB_RELEASES_URL}/latest","github_latest_release")
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code!=404:raise
+            latest=None  # Nothing published without the prerelease flag
+        tag=(latest or {}).get("tag_name") or ""
+        if tag and not ('-alpha' in tag or '-beta' in tag):return [latest]
+        # A -beta/-alpha tag published without the prerelease flag, or no release at all: scan the list instead
+    return fetch_releases_cached(f"{GITHUB_RELEASES_URL}?per_page=10","github_recent_releases")
+
 def check_for_updates()->None:
     release_type=input("Check version type (beta/stable): ").strip().lower()
     if release_type not in ["beta","stable"]:
         logger.warning("Invalid option. Choose 'beta' or 'stable'.")
         return
+    import requests
     try:
-        response=requests.get("https://api.github.com/repos/AT3K/TestFlight-Checker/releases",timeout=10)
-        response.raise_for_status()
-        current_version=version.parse(CURRENT_VERSION.lstrip("v"))
-        releases=response.json()
-        beta_versions=[tag for release in releases if (tag:=release['tag_name']) and ('-alpha' in tag or '-beta' in tag)]
-        stable_versions=[tag for release in releases if (tag:=release['tag_name']) and '-alpha' not in tag and '-beta' not in tag]
-        latest_version=max([version.parse(v.lstrip("v")) for v in (beta_versions if release_type=="beta" else stable_versions)],default=None)
-        if latest_version:
-            logger.info(f"Latest {release_type} release: {latest_version}")
+        releases=fetch_channel_releases(release_type)  # Only the chosen channel is fetched, after the prompt
+        want_beta=release_type=="beta"
+        # Fast path: tags in the project's own format compare as plain tuples; packaging is only loaded for other formats
+        use_packaging=release_tag_key(CURRENT_VERSION) is None
+        latest_version=latest_tag=None
+        for release in releases:
+            tag=release['tag_name']
+            if not tag or ('-alpha' in tag or '-beta' in tag)!=want_beta:continue
+            key=None if use_packaging else release_tag_key(tag)
+            if key is None:
+                if not use_packaging:  # First tag outside the fast-path format: re-key only the running max
+                    use_packaging=True
+                    if latest_tag:latest_version=parse_release_tag(latest_tag)
+                key=parse_release_tag(tag)
+            if latest_version is None or key>latest_version:latest_version,latest_tag=key,tag
+        if latest_tag:
+            current_version=parse_release_tag(CURRENT_VERSION) if use_packaging else release_tag_key(CURRENT_VERSION)
+            logger.info(f"Latest {release_type} release: {latest_version if use_packaging else release_key_str(latest_version)}")
             if latest_version>current_version:
                 if input(f"Pull latest {release_type} version? (y/n): ").strip().lower()=="y":pull_latest_update()
             elif latest_version<current_version:logger.info("You have a development build! 🧑‍💻")
             else:logger.info(f"Already on latest {release_type} version!")
         else:logger.warning(f"No {release_type} versions available.")
-    except (requests.exceptions.RequestException,ValueError) as e:logger.error(f"Update check failed: {e}")
+    except (requests.exceptions.RequestException,ValueError,OSError) as e:logger.error(f"Update check failed: {e}")
 
 def pull_latest_update()->None:
     if not is_tool_installed("git"):